@@ -18,13 +18,13 @@ bl_info = {
 import bpy
 import sys
 import os
-import importlib
+import importlib.util
 from bpy.types import AddonPreferences
 
 # Use directory name as addon ID
 ADDON_ID = os.path.basename(os.path.dirname(__file__))
-print(f"Addon ID: {ADDON_ID}")
 from . import (
+    api,
     ui,
     preferences,
     utils,
@@ -35,7 +35,7 @@ from . import (
 def setup_vendor_packages():
     """Setup vendor packages for imports."""
     vendor_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "vendor"))
-    print(f"Vendor directory: {vendor_dir}")
+    utils.log_debug("Vendor directory: %s", vendor_dir)
     
     # Ensure vendor directory exists
     utils.ensure_directory_exists(vendor_dir)
@@ -50,22 +50,13 @@ def setup_vendor_packages():
         from . import vendor
         utils.log_debug("Vendor package initialized")
         
-        # Explicitly reload requests
-        if 'requests' in sys.modules:
-            importlib.reload(sys.modules['requests'])
-            utils.log_debug("Requests module reloaded")
-        
-        # Try to import actual requests package
-        try:
-            import requests
-            # Explicit import of submodules
-            import requests.adapters
-            import requests.auth
-            import requests.sessions
-            
-            utils.log_debug(f"Requests module found: {requests.__version__ if hasattr(requests, '__version__') else 'unknown version'}")
-        except ImportError as e:
-            utils.log_error(f"Requests module import error: {str(e)}")
+        # Only check that requests can be found; the providers import it
+        # (from the vendor package) when they are first used
+        spec = importlib.util.find_spec("requests")
+        if spec is None:
+            utils.log_error("Requests module not found")
+        else:
+            utils.log_debug("Requests module found: %s", spec.origin)
     except ImportError as e:
         utils.log_error(f"Vendor package not properly initialized: {str(e)}")
 
@@ -129,6 +120,9 @@ def register():
     if debug_env in ("1", "true", "yes", "on"):
         utils.set_debug_mode(True)
 
+    # Re-run the compatibility and dependency checks on (re)load
+    utils.invalidate_caches()
+    
     # Check Blender compatibility
     is_compatible, message = utils.check_blender_compatibility()
     if not is_compatible:
@@ -141,37 +135,43 @@ def register():
     # Setup vendor packages
     try:
         setup_vendor_packages()
-        print("Vendor packages setup completed")
+        utils.log_debug("Vendor packages setup completed")
     except Exception as e:
-        print(f"Error setting up vendor packages: {e}")
+        utils.log_error(f"Error setting up vendor packages: {str(e)}")
     
     # Check UI resources
     check_ui_capabilities()
     
-    # Unregister first to prevent 'already registered' errors
-    try:
+    # Unregister first (only if already registered) to prevent 'already registered' errors
+    if KITSUNE_OT_startup_message.is_registered:
         bpy.utils.unregister_class(KITSUNE_OT_startup_message)
-    except:
-        pass
     
     # Register startup message operator
     bpy.utils.register_class(KITSUNE_OT_startup_message)
     
-    # Unregister preferences first to prevent 'already registered' errors
-    try:
+    # Unregister preferences first (only if already registered) to prevent 'already registered' errors
+    if preferences.KitsuneAddonPreferences.is_registered:
         bpy.utils.unregister_class(preferences.KitsuneAddonPreferences)
-    except:
-        pass
     
     # Register preferences 
     bpy.utils.register_class(preferences.KitsuneAddonPreferences)
     
+    # Apply the saved debug mode preference
+    try:
+        if preferences.get_addon_preferences().debug_mode:
+            utils.set_debug_mode(True)
+    except (KeyError, AttributeError):
+        preferences.get_addon_preferences.cache_clear()
+    
     # Register operators
     operators.register()
     
     # Register UI components
     ui.register()
     
+    # Start delivering API responses on the main thread
+    api.register()
+    
     # Display registration complete message
     utils.log_info("Kitsune addon registered successfully")
     
@@ -209,6 +209,12 @@ def unregister():
     except Exception as e:
         utils.log_error(f"Error checking timers: {str(e)}")
     
+    # Stop delivering API responses
+    try:
+        api.unregister()
+    except Exception as e:
+        utils.log_error(f"Error unregistering API: {str(e)}")
+    
     # Unregister UI components
     try:
         ui.unregister()
@@ -222,16 +228,19 @@ def unregister():
         utils.log_error(f"Error unregistering operators: {str(e)}")
     
     # Unregister preferences
-    try:
-        bpy.utils.unregister_class(preferences.KitsuneAddonPreferences)
-    except Exception as e:
-        utils.log_error(f"Error unregistering preferences: {str(e)}")
+    if preferences.KitsuneAddonPreferences.is_registered:
+        try:
+            bpy.utils.unregister_class(preferences.KitsuneAddonPreferences)
+        except RuntimeError as e:
+            utils.log_error(f"Error unregistering preferences: {str(e)}")
+    preferences.get_addon_preferences.cache_clear()
     
     # Unregister startup message operator
-    try:
-        bpy.utils.unregister_class(KITSUNE_OT_startup_message)
-    except Exception as e:
-        utils.log_error(f"Error unregistering startup message: {str(e)}")
+    if KITSUNE_OT_startup_message.is_registered:
+        try:
+            bpy.utils.unregister_class(KITSUNE_OT_startup_message)
+        except RuntimeError as e:
+            utils.log_error(f"Error unregistering startup message: {str(e)}")
     
     utils.log_info("Kitsune addon unregistered")
 
@@ -239,6 +248,6 @@ def unregister():
 if __name__ == "__main__":
     try:
         unregister()
-    except:
+    except Exception:
         pass
     register()
\ No newline at end of file
@@ -1,10 +1,63 @@
 # Core API functionality for Kitsune
 import threading
 import json
+import re
+import functools
+import queue
 from abc import ABC, abstractmethod
 import bpy
 from ..utils import log_debug, log_error
 
+# Code blocks with Python, bpy, or Blender markers
+_CODE_BLOCK_RE = re.compile(r"```(?:python|bpy|blender)?\s*([\s\S]*?)```")
+
+# Start of unfenced Blender code (fallback extraction)
+_BPY_IMPORT_RE = re.compile(r"^\s*(?:import bpy|from bpy)")
+
+# Polling intervals for delivering request results (seconds)
+RESPONSE_POLL_INTERVAL = 0.05
+RESPONSE_IDLE_INTERVAL = 0.5
+
+# Results from request threads, waiting to be delivered on the main thread
+_response_queue = queue.Queue()
+
+# Number of request threads currently running
+_active_requests = 0
+_active_requests_lock = threading.Lock()
+
+def dispatch_response(callback, result):
+    """
+    Queue a request result for delivery to its callback on the main thread.
+    
+    Safe to call from any thread. Code is extracted from successful responses
+    here (on the calling request thread) and added under "code".
+    
+    Args:
+        callback (callable): Function to call with the result
+        result (dict): Result passed to the callback
+    """
+    if "response" in result and "code" not in result:
+        result["code"] = format_code_for_execution(result["response"])
+    _response_queue.put((callback, result))
+
+def _drain_responses():
+    """Deliver queued results to their callbacks (runs as a Blender timer)."""
+    while True:
+        try:
+            callback, result = _response_queue.get_nowait()
+        except queue.Empty:
+            break
+        
+        try:
+            callback(result)
+        except Exception as e:
+            log_error(f"Response callback error: {str(e)}")
+    
+    # Poll quickly only while requests are in flight
+    if _active_requests:
+        return RESPONSE_POLL_INTERVAL
+    return RESPONSE_IDLE_INTERVAL
+
 class APIProvider(ABC):
     """Abstract base class for all LLM API providers."""
     
@@ -58,16 +111,20 @@ class APIRequestThread(threading.Thread):
         
     def run(self):
         """Execute the API request in a separate thread."""
+        global _active_requests
+        with _active_requests_lock:
+            _active_requests += 1
+        
         try:
             self.provider.send_request(self.prompt, self.context_info, self.callback)
         except Exception as e:
             log_error(f"API request error: {str(e)}")
             # Call callback with error
             if self.callback:
-                bpy.app.timers.register(
-                    lambda: self.callback({"error": str(e)}),
-                    first_interval=0.1
-                )
+                dispatch_response(self.callback, {"error": str(e)})
+        finally:
+            with _active_requests_lock:
+                _active_requests -= 1
 
 def get_provider_instance(provider_id):
     """
@@ -94,6 +151,7 @@ def get_provider_instance(provider_id):
     
     return providers[provider_id]()
 
+@functools.lru_cache(maxsize=128)
 def format_code_for_execution(response):
     """
     Extract Python code from LLM response.
@@ -104,11 +162,8 @@ def format_code_for_execution(response):
     Returns:
         str: Extracted code or None if no code found
     """
-    import re
-    
     # Look for code blocks with Python, bpy, or Blender markers
-    pattern = r"```(?:python|bpy|blender)?\s*([\s\S]*?)```"
-    matches = re.findall(pattern, response)
+    matches = _CODE_BLOCK_RE.findall(response)
     
     if matches:
         # Return the largest code block found
@@ -116,12 +171,11 @@ def format_code_for_execution(response):
     
     # If no code blocks found, try to extract any Python-like code
     # This is a fallback and less reliable
-    lines = response.split('\n')
     code_lines = []
     in_code = False
     
-    for line in lines:
-        if line.strip().startswith('import bpy') or line.strip().startswith('from bpy'):
+    for line in response.splitlines():
+        if not in_code and _BPY_IMPORT_RE.match(line):
             in_code = True
             
         if in_code:
@@ -179,4 +233,14 @@ def create_context_info():
         "render_engine": bpy.context.scene.render.engine
     }
     
-    return context
\ No newline at end of file
+    return context
+
+def register():
+    """Start the timer that delivers request results on the main thread."""
+    if not bpy.app.timers.is_registered(_drain_responses):
+        bpy.app.timers.register(_drain_responses, persistent=True)
+
+def unregister():
+    """Stop the result delivery timer."""
+    if bpy.app.timers.is_registered(_drain_responses):
+        bpy.app.timers.unregister(_drain_responses)
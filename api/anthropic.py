@@ -1,8 +1,8 @@
 # Anthropic API integration for Kitsune
 import json
-import bpy
 from ..vendor import requests
-from . import APIProvider
+from . import APIProvider, dispatch_response
+from ..preferences import get_addon_preferences
 from ..utils import log_debug, log_error
 
 class AnthropicProvider(APIProvider):
@@ -121,17 +121,14 @@ Please respond with Python code that I can run in Blender to accomplish this."""
             context_info (dict): Context information from Blender
             callback (callable): Function to call with results
         """
-        addon_prefs = bpy.context.preferences.addons["kitsune"].preferences
+        addon_prefs = get_addon_preferences()
         api_key = addon_prefs.anthropic_api_key
         model = addon_prefs.anthropic_model
         
         if not api_key:
             error_msg = "No API key provided for Anthropic. Please set your API key in the addon preferences."
             log_error(error_msg)
-            bpy.app.timers.register(
-                lambda: callback({"error": error_msg}),
-                first_interval=0.1
-            )
+            dispatch_response(callback, {"error": error_msg})
             return
         
         headers = {
@@ -151,7 +148,7 @@ Please respond with Python code that I can run in Blender to accomplish this."""
         }
         
         try:
-            log_debug(f"Sending request to Anthropic API with model: {model}")
+            log_debug("Sending request to Anthropic API with model: %s", model)
             response = requests.post(
                 self._base_url,
                 headers=headers,
@@ -165,10 +162,7 @@ Please respond with Python code that I can run in Blender to accomplish this."""
                     content_parts = [part for part in response_json['content'] if part.get('type') == 'text']
                     if content_parts:
                         text_content = content_parts[0].get('text', '')
-                        bpy.app.timers.register(
-                            lambda: callback({"response": text_content}),
-                            first_interval=0.1
-                        )
+                        dispatch_response(callback, {"response": text_content})
                         return
             
             # If we get here, something went wrong
@@ -181,23 +175,14 @@ Please respond with Python code that I can run in Blender to accomplish this."""
                 error_message = f"Anthropic API error: {response.status_code} - {response.text}"
             
             log_error(error_message)
-            bpy.app.timers.register(
-                lambda: callback({"error": error_message}),
-                first_interval=0.1
-            )
+            dispatch_response(callback, {"error": error_message})
             
         except requests.exceptions.Timeout:
             error_msg = "Request to Anthropic API timed out. Please try again."
             log_error(error_msg)
-            bpy.app.timers.register(
-                lambda: callback({"error": error_msg}),
-                first_interval=0.1
-            )
+            dispatch_response(callback, {"error": error_msg})
             
         except Exception as e:
             error_msg = f"Error communicating with Anthropic API: {str(e)}"
             log_error(error_msg)
-            bpy.app.timers.register(
-                lambda: callback({"error": error_msg}),
-                first_interval=0.1
-            )
\ No newline at end of file
+            dispatch_response(callback, {"error": error_msg})
\ No newline at end of file
@@ -1,8 +1,8 @@
 # DeepSeek API integration for Kitsune
 import json
-import bpy
 from ..vendor import requests
-from . import APIProvider
+from . import APIProvider, dispatch_response
+from ..preferences import get_addon_preferences
 from ..utils import log_debug, log_error
 
 class DeepSeekProvider(APIProvider):
@@ -136,17 +136,14 @@ Please respond with Python code that I can run in Blender to accomplish this."""
             context_info (dict): Context information from Blender
             callback (callable): Function to call with results
         """
-        addon_prefs = bpy.context.preferences.addons["kitsune"].preferences
+        addon_prefs = get_addon_preferences()
         api_key = addon_prefs.deepseek_api_key
         model = addon_prefs.deepseek_model
         
         if not api_key:
             error_msg = "No API key provided for DeepSeek. Please set your API key in the addon preferences."
             log_error(error_msg)
-            bpy.app.timers.register(
-                lambda: callback({"error": error_msg}),
-                first_interval=0.1
-            )
+            dispatch_response(callback, {"error": error_msg})
             return
         
         headers = {
@@ -164,7 +161,7 @@ Please respond with Python code that I can run in Blender to accomplish this."""
         }
         
         try:
-            log_debug(f"Sending request to DeepSeek API with model: {model_name}")
+            log_debug("Sending request to DeepSeek API with model: %s", model_name)
             response = requests.post(
                 self._base_url,
                 headers=headers,
@@ -180,19 +177,13 @@ Please respond with Python code that I can run in Blender to accomplish this."""
                     content = message.get('content', '')
                     
                     if content:
-                        bpy.app.timers.register(
-                            lambda: callback({"response": content}),
-                            first_interval=0.1
-                        )
+                        dispatch_response(callback, {"response": content})
                         return
                 
                 # If we get here, response was successful but content invalid
                 error_msg = "Unexpected response structure from DeepSeek API"
                 log_error(error_msg)
-                bpy.app.timers.register(
-                    lambda: callback({"error": error_msg}),
-                    first_interval=0.1
-                )
+                dispatch_response(callback, {"error": error_msg})
                 return
             
             # If we get here, something went wrong
@@ -205,23 +196,14 @@ Please respond with Python code that I can run in Blender to accomplish this."""
                 error_message = f"DeepSeek API error: {response.status_code} - {response.text}"
             
             log_error(error_message)
-            bpy.app.timers.register(
-                lambda: callback({"error": error_message}),
-                first_interval=0.1
-            )
+            dispatch_response(callback, {"error": error_message})
             
         except requests.exceptions.Timeout:
             error_msg = "Request to DeepSeek API timed out. Please try again."
             log_error(error_msg)
-            bpy.app.timers.register(
-                lambda: callback({"error": error_msg}),
-                first_interval=0.1
-            )
+            dispatch_response(callback, {"error": error_msg})
             
         except Exception as e:
             error_msg = f"Error communicating with DeepSeek API: {str(e)}"
             log_error(error_msg)
-            bpy.app.timers.register(
-                lambda: callback({"error": error_msg}),
-                first_interval=0.1
-            )
\ No newline at end of file
+            dispatch_response(callback, {"error": error_msg})
\ No newline at end of file
@@ -1,8 +1,8 @@
 # Google Gemini API integration for Kitsune
 import json
-import bpy
 from ..vendor import requests
-from . import APIProvider
+from . import APIProvider, dispatch_response
+from ..preferences import get_addon_preferences
 from ..utils import log_debug, log_error
 
 class GoogleProvider(APIProvider):
@@ -140,17 +140,14 @@ Please respond with Python code that I can run in Blender to accomplish this."""
             context_info (dict): Context information from Blender
             callback (callable): Function to call with results
         """
-        addon_prefs = bpy.context.preferences.addons["kitsune"].preferences
+        addon_prefs = get_addon_preferences()
         api_key = addon_prefs.google_api_key
         model = addon_prefs.google_model
         
         if not api_key:
             error_msg = "No API key provided for Google Gemini. Please set your API key in the addon preferences."
             log_error(error_msg)
-            bpy.app.timers.register(
-                lambda: callback({"error": error_msg}),
-                first_interval=0.1
-            )
+            dispatch_response(callback, {"error": error_msg})
             return
         
         model_name = self._convert_model_name(model or self._default_model)
@@ -163,7 +160,7 @@ Please respond with Python code that I can run in Blender to accomplish this."""
         data = self._build_content(prompt, context_info)
         
         try:
-            log_debug(f"Sending request to Google Gemini API with model: {model_name}")
+            log_debug("Sending request to Google Gemini API with model: %s", model_name)
             response = requests.post(
                 request_url,
                 headers=headers,
@@ -181,18 +178,12 @@ Please respond with Python code that I can run in Blender to accomplish this."""
                     response_json['candidates'][0]['content']['parts']):
                     
                     content = response_json['candidates'][0]['content']['parts'][0]['text']
-                    bpy.app.timers.register(
-                        lambda: callback({"response": content}),
-                        first_interval=0.1
-                    )
+                    dispatch_response(callback, {"response": content})
                     return
                 else:
                     error_msg = "Unexpected response structure from Google Gemini API"
                     log_error(error_msg)
-                    bpy.app.timers.register(
-                        lambda: callback({"error": error_msg}),
-                        first_interval=0.1
-                    )
+                    dispatch_response(callback, {"error": error_msg})
                     return
             
             # If we get here, something went wrong
@@ -205,23 +196,14 @@ Please respond with Python code that I can run in Blender to accomplish this."""
                 error_message = f"Google Gemini API error: {response.status_code} - {response.text}"
             
             log_error(error_message)
-            bpy.app.timers.register(
-                lambda: callback({"error": error_message}),
-                first_interval=0.1
-            )
+            dispatch_response(callback, {"error": error_message})
             
         except requests.exceptions.Timeout:
             error_msg = "Request to Google Gemini API timed out. Please try again."
             log_error(error_msg)
-            bpy.app.timers.register(
-                lambda: callback({"error": error_msg}),
-                first_interval=0.1
-            )
+            dispatch_response(callback, {"error": error_msg})
             
         except Exception as e:
             error_msg = f"Error communicating with Google Gemini API: {str(e)}"
             log_error(error_msg)
-            bpy.app.timers.register(
-                lambda: callback({"error": error_msg}),
-                first_interval=0.1
-            )
\ No newline at end of file
+            dispatch_response(callback, {"error": error_msg})
\ No newline at end of file
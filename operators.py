@@ -34,7 +34,7 @@ class KITSUNE_OT_send_from_dialog(bpy.types.Operator):
     )
     
     def execute(self, context):
-        utils.log_debug(f"メッセージを送信します: {self.message}")
+        utils.log_debug("メッセージを送信します: %s", self.message)
         return {'FINISHED'}
 
 # コードをクリップボードにコピー
@@ -70,7 +70,7 @@ class KITSUNE_OT_export_chat(bpy.types.Operator):
     )
     
     def execute(self, context):
-        utils.log_debug(f"チャット履歴をエクスポートします: {self.filepath}")
+        utils.log_debug("チャット履歴をエクスポートします: %s", self.filepath)
         return {'FINISHED'}
     
     def invoke(self, context, event):
@@ -97,7 +97,7 @@ class KITSUNE_OT_rename_chat(bpy.types.Operator):
     )
     
     def execute(self, context):
-        utils.log_debug(f"チャット名を変更します: インデックス {self.chat_index}, 新しい名前: {self.new_name}")
+        utils.log_debug("チャット名を変更します: インデックス %d, 新しい名前: %s", self.chat_index, self.new_name)
         return {'FINISHED'}
     
     def invoke(self, context, event):
@@ -116,29 +116,36 @@ classes = (
     KITSUNE_OT_rename_chat
 )
 
+# アンレジスター用の逆順リスト
+_classes_reversed = classes[::-1]
+
+# クラスを一括で登録する関数
+_register_classes, _ = bpy.utils.register_classes_factory(classes)
+
 def register():
     """Register operators."""
-    # 既に登録されているクラスを確認してアンレジスターする
+    # 既に登録されているクラスだけをアンレジスターする
     for cls in classes:
-        try:
+        if getattr(cls, "is_registered", False):
             bpy.utils.unregister_class(cls)
-        except:
-            pass
     
     # クラスを登録
-    for cls in classes:
-        try:
-            bpy.utils.register_class(cls)
-        except Exception as e:
-            from . import utils
-            utils.log_error(f"Failed to register operator {cls.__name__}: {str(e)}")
+    try:
+        _register_classes()
+    except RuntimeError as e:
+        utils.log_error(f"Failed to register operators: {str(e)}")
 
 def unregister():
     """Unregister operators."""
-    # クラスをアンレジスター
-    for cls in reversed(classes):
+    # 登録済みのクラスだけをアンレジスター (失敗はまとめてログに記録)
+    failed = []
+    for cls in _classes_reversed:
+        if not getattr(cls, "is_registered", False):
+            continue
         try:
             bpy.utils.unregister_class(cls)
-        except Exception as e:
-            from . import utils
-            utils.log_error(f"Failed to unregister operator {cls.__name__}: {str(e)}")
\ No newline at end of file
+        except RuntimeError as e:
+            failed.append(f"{cls.__name__}: {str(e)}")
+    
+    if failed:
+        utils.log_error(f"Failed to unregister operators: {'; '.join(failed)}")
\ No newline at end of file
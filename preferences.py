@@ -1,4 +1,5 @@
 # Addon preferences for Kitsune
+import functools
 import bpy
 from bpy.props import (
     StringProperty,
@@ -9,6 +10,14 @@ from bpy.props import (
 from . import utils
 from .api import get_provider_instance
 
+# Settings label, API key property and model property of each provider
+PROVIDER_SETTINGS = {
+    'anthropic': ("Anthropic Settings:", "anthropic_api_key", "anthropic_model"),
+    'google': ("Google Gemini Settings:", "google_api_key", "google_model"),
+    'deepseek': ("DeepSeek Settings:", "deepseek_api_key", "deepseek_model"),
+    'openai': ("OpenAI Settings:", "openai_api_key", "openai_model"),
+}
+
 class KitsuneAddonPreferences(bpy.types.AddonPreferences):
     """Addon preferences for Kitsune."""
     
@@ -18,7 +27,8 @@ class KitsuneAddonPreferences(bpy.types.AddonPreferences):
     debug_mode: BoolProperty(
         name="Debug Mode",
         description="Enable debug logging",
-        default=False
+        default=False,
+        update=lambda self, context: utils.set_debug_mode(self.debug_mode)
     )
     
     # Provider selection
@@ -145,12 +155,12 @@ class KitsuneAddonPreferences(bpy.types.AddonPreferences):
             tuple: (is_valid, message)
         """
         provider_id = self.api_provider
-        api_key_attr = f"{provider_id}_api_key"
+        settings = PROVIDER_SETTINGS.get(provider_id)
         
-        if not hasattr(self, api_key_attr):
+        if settings is None:
             return False, f"Unknown provider: {provider_id}"
-            
-        api_key = getattr(self, api_key_attr)
+        
+        api_key = getattr(self, settings[1])
         
         if not api_key:
             return False, f"API key for {provider_id} is not set. Please add your API key in the addon preferences."
@@ -176,31 +186,14 @@ class KitsuneAddonPreferences(bpy.types.AddonPreferences):
         provider_box.prop(self, "api_provider")
         
         # Provider-specific settings
-        selected_provider = self.api_provider
+        settings = PROVIDER_SETTINGS.get(self.api_provider)
         
-        if selected_provider == 'anthropic':
-            model_box = provider_box.box()
-            model_box.label(text="Anthropic Settings:", icon='SETTINGS')
-            model_box.prop(self, "anthropic_api_key")
-            model_box.prop(self, "anthropic_model")
-            
-        elif selected_provider == 'google':
-            model_box = provider_box.box()
-            model_box.label(text="Google Gemini Settings:", icon='SETTINGS')
-            model_box.prop(self, "google_api_key")
-            model_box.prop(self, "google_model")
-            
-        elif selected_provider == 'deepseek':
+        if settings is not None:
+            label, api_key_prop, model_prop = settings
             model_box = provider_box.box()
-            model_box.label(text="DeepSeek Settings:", icon='SETTINGS')
-            model_box.prop(self, "deepseek_api_key")
-            model_box.prop(self, "deepseek_model")
-            
-        elif selected_provider == 'openai':
-            model_box = provider_box.box()
-            model_box.label(text="OpenAI Settings:", icon='SETTINGS')
-            model_box.prop(self, "openai_api_key")
-            model_box.prop(self, "openai_model")
+            model_box.label(text=label, icon='SETTINGS')
+            model_box.prop(self, api_key_prop)
+            model_box.prop(self, model_prop)
         
         # Chat settings
         chat_box = layout.box()
@@ -229,6 +222,19 @@ class KitsuneAddonPreferences(bpy.types.AddonPreferences):
         else:
             compatibility_box.label(text=f"Missing dependencies: {', '.join(missing)}", icon='ERROR')
 
+@functools.lru_cache(maxsize=1)
+def get_addon_preferences():
+    """
+    Get this addon's preferences.
+    
+    The lookup is cached; call get_addon_preferences.cache_clear() when
+    the addon is unregistered.
+    
+    Returns:
+        KitsuneAddonPreferences: The addon preferences
+    """
+    return bpy.context.preferences.addons[__package__].preferences
+
 # Function to get active provider
 def get_active_provider():
     """
@@ -237,6 +243,6 @@ def get_active_provider():
     Returns:
         APIProvider: The active provider instance
     """
-    preferences = bpy.context.preferences.addons[__package__].preferences
+    preferences = get_addon_preferences()
     provider_id = preferences.api_provider
     return get_provider_instance(provider_id)
\ No newline at end of file
@@ -1,8 +1,72 @@
 import bpy
+import bpy.utils.previews
 import datetime
+import functools
+import os
+import uuid
+from bpy.app.handlers import persistent
 from bpy.props import StringProperty, BoolProperty, EnumProperty, IntProperty, PointerProperty, CollectionProperty, FloatProperty
 from . import utils
 from .api import get_provider_instance, create_context_info, APIRequestThread
+from .preferences import get_addon_preferences, PROVIDER_SETTINGS
+
+# Enum items, shared as module-level tuples
+VIEW_MODE_ITEMS = (
+    ('CHAT', "Chat", "Chat mode"),
+    ('SETTINGS', "Settings", "Settings mode"),
+)
+VIEW_MODES = tuple(item[0] for item in VIEW_MODE_ITEMS)
+PREVIEW_SIZE_ITEMS = (
+    ('SMALL', "Small", "Small size (128px)"),
+    ('MEDIUM', "Medium", "Medium size (256px)"),
+    ('LARGE', "Large", "Large size (512px)"),
+)
+SCROLL_DIRECTION_ITEMS = (
+    ('UP', "Up", "Scroll up"),
+    ('DOWN', "Down", "Scroll down"),
+)
+ATTACH_MODE_ITEMS = (
+    ('FILE', "File", "Attach any file"),
+    ('IMAGE', "Image", "Attach an image file"),
+)
+
+# File extensions treated as image attachments
+IMAGE_EXTENSIONS = frozenset({'jpg', 'jpeg', 'png', 'bmp', 'tiff', 'tga', 'webp', 'exr'})
+IMAGE_FILTER_GLOB = ";".join(f"*.{ext}" for ext in sorted(IMAGE_EXTENSIONS))
+
+# Icon scale of attachment thumbnails for each image_preview_size
+PREVIEW_ICON_SCALES = {'SMALL': 3.0, 'MEDIUM': 5.0, 'LARGE': 8.0}
+
+# Thumbnails kept before the preview collection is reset
+MAX_THUMBNAILS = 64
+
+# Number of generated code lines shown inside a chat message
+CODE_PREVIEW_LINES = 10
+
+# Number of code lines shown in the preview dialog
+PREVIEW_DIALOG_LINES = 30
+
+# Text datablock holding the full previewed code
+PREVIEW_TEXT_NAME = "Kitsune Preview"
+
+# Approximate height of a drawn chat message in pixels (at UI scale 1.0)
+MESSAGE_HEIGHT_PX = 120
+MIN_VISIBLE_MESSAGES = 3
+
+# Visible message count, recomputed only when the chat height or UI scale changes
+_visible_messages = {"key": None, "count": 5}
+
+def get_visible_message_count(region, height_factor=1.0):
+    """Get how many chat messages fit in the given fraction of the region height"""
+    height = int(region.height * height_factor)
+    ui_scale = bpy.context.preferences.system.ui_scale
+    key = (height, ui_scale)
+    if key != _visible_messages["key"]:
+        message_height = int(MESSAGE_HEIGHT_PX * ui_scale)
+        _visible_messages["key"] = key
+        _visible_messages["count"] = max(MIN_VISIBLE_MESSAGES, height // max(1, message_height))
+    
+    return _visible_messages["count"]
 
 # Chat attachment
 class KitsuneAttachment(bpy.types.PropertyGroup):
@@ -75,20 +139,81 @@ class KitsuneChatSession(bpy.types.PropertyGroup):
         description="Index of the currently active message",
         default=0
     )
+    message_count: IntProperty(
+        name="Message Count",
+        description="Number of messages in the chat session",
+        default=0,
+        min=0
+    )
     created_at: StringProperty(
         name="Created At",
         description="Creation date and time of the session",
         default=""
     )
+    session_id: StringProperty(
+        name="Session ID",
+        description="Stable identifier of the session",
+        default="",
+        options={'HIDDEN'}
+    )
 
 # UI Properties
-class KitsuneUIProperties(bpy.types.PropertyGroup):
-    """Property group for Kitsune UI"""
+def update_input_text(self, context):
+    """Cache whether the input field has text (runs on confirm, not per keystroke)"""
+    has_input = bool(self.input_text.strip())
+    if self.has_input_text != has_input:
+        self.has_input_text = has_input
+
+def update_attachment_path(self, context):
+    """Cache the attachment file name when the attachment path changes"""
+    self.attachment_name = os.path.basename(self.attachment_path)
+
+def update_view_mode(self, context):
+    """Register the settings mode classes on the first switch to settings mode"""
+    if self.view_mode == 'SETTINGS':
+        ensure_settings_registered()
+
+class KitsuneUIState(bpy.types.PropertyGroup):
+    """Transient UI state (on the window manager, so not saved or undone with the scene)"""
     input_text: StringProperty(
         name="Input",
         description="User input text",
-        default=""
+        default="",
+        update=update_input_text
+    )
+    has_input_text: BoolProperty(
+        name="Has Input Text",
+        description="Whether the input field contains non-blank text",
+        default=False,
+        options={'HIDDEN'}
+    )
+    is_processing: BoolProperty(
+        name="Is Processing",
+        description="Whether AI is processing",
+        default=False
+    )
+    attachment_path: StringProperty(
+        name="Attachment Path",
+        description="Path to the attachment file",
+        default="",
+        subtype='FILE_PATH',
+        update=update_attachment_path
+    )
+    attachment_name: StringProperty(
+        name="Attachment Name",
+        description="File name of the attachment",
+        default="",
+        options={'HIDDEN'}
     )
+    # Scroll position
+    scroll_position: IntProperty(
+        name="Scroll Position",
+        description="Scroll position in chat history",
+        default=0
+    )
+
+class KitsuneUIProperties(bpy.types.PropertyGroup):
+    """Property group for Kitsune UI"""
     chat_sessions: CollectionProperty(
         type=KitsuneChatSession,
         name="Chat Sessions",
@@ -99,25 +224,12 @@ class KitsuneUIProperties(bpy.types.PropertyGroup):
         description="Index of the currently active session",
         default=0
     )
-    is_processing: BoolProperty(
-        name="Is Processing",
-        description="Whether AI is processing",
-        default=False
-    )
     view_mode: EnumProperty(
         name="View Mode",
         description="Display mode",
-        items=[
-            ('CHAT', "Chat", "Chat mode"),
-            ('SETTINGS', "Settings", "Settings mode"),
-        ],
-        default='CHAT'
-    )
-    attachment_path: StringProperty(
-        name="Attachment Path",
-        description="Path to the attachment file",
-        default="",
-        subtype='FILE_PATH'
+        items=VIEW_MODE_ITEMS,
+        default='CHAT',
+        update=update_view_mode
     )
     panel_height: FloatProperty(
         name="Panel Height",
@@ -126,35 +238,276 @@ class KitsuneUIProperties(bpy.types.PropertyGroup):
         min=0.3,
         max=1.0
     )
-    # Chat display settings
-    chat_display_settings: BoolProperty(
-        name="Display Settings",
-        description="Expand display settings",
-        default=False
-    )
     # Image attachment settings
     image_preview_size: EnumProperty(
         name="Image Preview Size",
         description="Preview size of attached images",
-        items=[
-            ('SMALL', "Small", "Small size (128px)"),
-            ('MEDIUM', "Medium", "Medium size (256px)"),
-            ('LARGE', "Large", "Large size (512px)"),
-        ],
+        items=PREVIEW_SIZE_ITEMS,
         default='MEDIUM'
     )
-    # Scroll position
-    scroll_position: IntProperty(
-        name="Scroll Position",
-        description="Scroll position in chat history",
-        default=0
+
+def find_addon_preferences():
+    """Return the cached addon preferences, or None if the addon is not enabled"""
+    try:
+        return get_addon_preferences()
+    except KeyError:
+        return None
+
+def get_active_session(kitsune_ui):
+    """Get the active chat session, or None if there is none"""
+    sessions = kitsune_ui.chat_sessions
+    index = kitsune_ui.active_session_index
+    if 0 <= index < len(sessions):
+        return sessions[index]
+    return None
+
+def find_session(session_id):
+    """Find a chat session by its session_id in any scene, or None if it no longer exists"""
+    for scene in bpy.data.scenes:
+        for session in scene.kitsune_ui.chat_sessions:
+            if session.session_id == session_id:
+                return session
+    return None
+
+def sync_message_counts():
+    """Set message_count from the messages of every chat session
+    
+    Files saved before message_count existed load with a count of 0.
+    """
+    for scene in bpy.data.scenes:
+        for session in scene.kitsune_ui.chat_sessions:
+            count = len(session.messages)
+            if session.message_count != count:
+                session.message_count = count
+    return None
+
+@persistent
+def on_load_post(*args):
+    """Bring the chat sessions of a loaded file in step with the add-on"""
+    # Cached records and histories are keyed by session pointers, which the
+    # new file's sessions may reuse
+    invalidate_layout_plan()
+    sync_message_counts()
+
+@persistent
+def on_undo_redo(*args):
+    """Drop cached records and histories (undo can restore other messages at the same count)"""
+    invalidate_layout_plan()
+
+@functools.lru_cache(maxsize=8)
+def split_code_lines(code):
+    """Split code into a tuple of lines, cached across dialog redraws"""
+    return tuple(code.splitlines())
+
+def split_code_head(code, max_lines):
+    """Split code into its first max_lines lines and the number of hidden lines"""
+    code_lines = split_code_lines(code)
+    return code_lines[:max_lines], max(0, len(code_lines) - max_lines)
+
+@functools.lru_cache(maxsize=32)
+def compile_code(code):
+    """Compile generated code, reusing the code object on repeat runs"""
+    return compile(code, "<kitsune>", "exec")
+
+def write_code_text(name, code):
+    """Write code into a text datablock, creating it if needed"""
+    text = bpy.data.texts.get(name)
+    if text is None:
+        text = bpy.data.texts.new(name)
+    elif text.as_string() == code:
+        # Same snippet previewed again, keep the existing buffer
+        return text
+    text.from_string(code)
+    return text
+
+# Attachment thumbnails, created on first use
+_thumbnails = None
+
+def get_thumbnail_icon(path):
+    """Get the icon id of an image thumbnail, loading it on first request"""
+    global _thumbnails
+    if _thumbnails is None:
+        _thumbnails = bpy.utils.previews.new()
+    
+    thumbnail = _thumbnails.get(path)
+    if thumbnail is None:
+        # Keep memory bounded for long chats with many images
+        if len(_thumbnails) >= MAX_THUMBNAILS:
+            _thumbnails.clear()
+        thumbnail = _thumbnails.load(path, path, 'IMAGE')
+    return thumbnail.icon_id
+
+def free_thumbnails():
+    """Release all attachment thumbnails"""
+    global _thumbnails
+    if _thumbnails is not None:
+        bpy.utils.previews.remove(_thumbnails)
+        _thumbnails = None
+
+# Display records for each chat session, keyed by session pointer
+_layout_plans = {}
+
+class MessageRecord:
+    """Display record for a chat message (slots keep one per cached message small)"""
+    __slots__ = ("is_user", "timestamp", "lines", "attachments", "code", "code_lines", "code_hidden_lines")
+    
+    def __init__(self, is_user, timestamp, lines, attachments, code, code_lines, code_hidden_lines):
+        self.is_user = is_user
+        self.timestamp = timestamp
+        self.lines = lines
+        self.attachments = attachments
+        self.code = code
+        self.code_lines = code_lines
+        self.code_hidden_lines = code_hidden_lines
+
+def build_message_record(message):
+    """Build the display record for a chat message
+    
+    Only what the panel draws is kept: runs of blank lines are collapsed
+    into a single None (drawn as one separator) and just the head of the
+    code is split (the full code stays on the message).
+    """
+    lines = []
+    for line in message.content.splitlines():
+        if line.strip():
+            lines.append(line)
+        elif lines and lines[-1] is not None:
+            lines.append(None)
+    
+    code = message.code
+    code_lines = code.splitlines() if code else []
+    return MessageRecord(
+        is_user=message.sender == "USER",
+        timestamp=message.timestamp,
+        lines=tuple(lines),
+        attachments=tuple(
+            (attachment.name, attachment.path if attachment.type == "IMAGE" and os.path.isfile(attachment.path) else "")
+            for attachment in message.attachments
+        ),
+        code=code,
+        code_lines=tuple(code_lines[:CODE_PREVIEW_LINES]),
+        code_hidden_lines=max(0, len(code_lines) - CODE_PREVIEW_LINES),
     )
 
+def get_visible_records(session, start, stop):
+    """Get the cached display records for messages start..stop of a session"""
+    key = session.as_pointer()
+    plan = _layout_plans.get(key)
+    
+    # Reset only when the session's messages have changed
+    if plan is None or len(plan) != session.message_count:
+        plan = [None] * session.message_count
+        _layout_plans[key] = plan
+    
+    # Records are built lazily, only for messages that are actually shown
+    messages = session.messages
+    for index in range(start, stop):
+        if plan[index] is None:
+            plan[index] = build_message_record(messages[index])
+    
+    return plan[start:stop]
+
+def invalidate_layout_plan(session=None):
+    """Drop cached display records for a session (or all sessions)"""
+    if session is None:
+        _layout_plans.clear()
+        # Session pointers may have changed, histories are keyed by them too
+        _chat_histories.clear()
+    else:
+        _layout_plans.pop(session.as_pointer(), None)
+
+# API chat history of each session, keyed by session pointer
+# (messages are only ever appended)
+_chat_histories = {}
+
+def get_chat_history(session):
+    """Get the chat history of a session in API format, converting only new messages"""
+    key = session.as_pointer()
+    history = _chat_histories.get(key)
+    message_count = session.message_count
+    
+    if history is None or len(history) > message_count:
+        history = []
+        _chat_histories[key] = history
+    
+    messages = session.messages
+    for index in range(len(history), message_count):
+        msg = messages[index]
+        history.append({
+            "role": "user" if msg.sender == "USER" else "assistant",
+            "content": msg.content
+        })
+    
+    return list(history)
+
+def redraw_view3d_areas():
+    """Tag the sidebar region of every 3D View showing it for redraw
+    
+    Only the 'UI' region (which hosts the Kitsune panels) is tagged, so the
+    viewports themselves are not redrawn.
+    """
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type != 'VIEW_3D' or not area.spaces.active.show_region_ui:
+                continue
+            for region in area.regions:
+                if region.type == 'UI':
+                    region.tag_redraw()
+
+# Delay used to coalesce redraw requests (seconds)
+REDRAW_COALESCE_INTERVAL = 0.05
+
+def _redraw_now():
+    """Timer callback performing a requested redraw"""
+    redraw_view3d_areas()
+    return None
+
+def schedule_redraw():
+    """Request a sidebar redraw; requests made before it runs share one redraw"""
+    # The timer itself is the pending state (a file load removes it, so no
+    # flag can be left set)
+    if not bpy.app.timers.is_registered(_redraw_now):
+        bpy.app.timers.register(_redraw_now, first_interval=REDRAW_COALESCE_INTERVAL)
+
+def find_sidebar_region():
+    """Get the sidebar region of the first 3D View showing it, or None"""
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type != 'VIEW_3D' or not area.spaces.active.show_region_ui:
+                continue
+            for region in area.regions:
+                if region.type == 'UI':
+                    return region
+    return None
+
+def scroll_to_latest(ui_state, session, region, height_factor=1.0):
+    """Scroll the chat to its newest message, skipping no-op writes"""
+    last_index = max(0, session.message_count - 1)
+    if session.active_message_index != last_index:
+        session.active_message_index = last_index
+    
+    if not get_addon_preferences().auto_scroll:
+        return
+    
+    if region is None:
+        # No sidebar to measure; the panel clamps this to the last page
+        new_scroll = session.message_count
+    else:
+        new_scroll = max(0, session.message_count - get_visible_message_count(region, height_factor))
+    if ui_state.scroll_position != new_scroll:
+        ui_state.scroll_position = new_scroll
+
+# Header label, icon and whether generated code is shown, keyed by is_user
+_MESSAGE_STYLES = {
+    True: ("You", 'USER', False),
+    False: ("AI", 'LIGHT', True),
+}
+
 # Draw chat message function
-def draw_chat_message(layout, message, addon_prefs):
-    """Draw a chat message"""
+def draw_chat_message(layout, record, addon_prefs, thumbnail_scale):
+    """Draw a chat message from its display record"""
     
-    is_user = message.sender == "USER"
+    sender_label, sender_icon, show_code = _MESSAGE_STYLES[record.is_user]
     
     # Message box
     box = layout.box()
@@ -162,58 +515,63 @@ def draw_chat_message(layout, message, addon_prefs):
     
     # Header (sender and time)
     row = box.row()
+    row.label(text=sender_label, icon=sender_icon)
     
-    if is_user:
-        row.label(text="You", icon='USER')
-    else:
-        row.label(text="AI", icon='LIGHT')
-        
-    if addon_prefs.show_timestamps and message.timestamp:
-        row.label(text=message.timestamp)
+    if addon_prefs.show_timestamps and record.timestamp:
+        row.label(text=record.timestamp)
     
     # Message content
     content_box = box.column()
     content_box.scale_y = 0.9
     
     # Message text (displayed line by line)
-    for line in message.content.split("\n"):
-        if line.strip():  # Skip empty lines
+    for line in record.lines:
+        if line is not None:  # Blank line runs are None
             content_box.label(text=line)
         else:
             content_box.separator()
     
     # If there are attachments
-    if len(message.attachments) > 0:
+    if record.attachments:
         box.separator()
         attachment_box = box.box()
         attachment_box.label(text="Attachments:", icon='FILE')
         
-        for attachment in message.attachments:
+        for attachment_name, image_path in record.attachments:
             row = attachment_box.row()
-            row.label(text=attachment.name)
+            row.label(text=attachment_name)
+            
+            # Thumbnails are only loaded for messages that are drawn
+            if image_path:
+                attachment_box.template_icon(icon_value=get_thumbnail_icon(image_path), scale=thumbnail_scale)
     
     # If there's code from AI
-    if not is_user and message.code:
+    code = record.code
+    if show_code and code:
         code_box = box.box()
         code_box.label(text="Generated Code:", icon='SCRIPT')
         
         code_col = code_box.column()
         code_col.scale_y = 0.85
         
-        # Display code
-        for line in message.code.split("\n"):
+        # Display the head of the code (full code is available via Preview)
+        for line in record.code_lines:
             code_col.label(text=line)
         
+        hidden_lines = record.code_hidden_lines
+        if hidden_lines > 0:
+            code_col.label(text=f"... ({hidden_lines} more lines)")
+        
         # Code operation buttons
         row = code_box.row(align=True)
         copy_op = row.operator("kitsune.copy_code", text="Copy", icon='COPYDOWN')
-        copy_op.code = message.code
+        copy_op.code = code
         
         preview_op = row.operator("kitsune.preview_code", text="Preview", icon='HIDE_OFF')
-        preview_op.code = message.code
+        preview_op.code = code
         
         execute_op = row.operator("kitsune.execute_code", text="Execute", icon='PLAY')
-        execute_op.code = message.code
+        execute_op.code = code
 
 # Chat session list
 class KITSUNE_UL_chat_sessions(bpy.types.UIList):
@@ -242,41 +600,25 @@ class KITSUNE_PT_api_settings(bpy.types.Panel):
     
     def draw(self, context):
         layout = self.layout
-        preferences = context.preferences.addons.get(__package__, None)
+        prefs = find_addon_preferences()
         
-        if not preferences:
+        if prefs is None:
             layout.label(text="Addon settings not found", icon='ERROR')
             return
-            
-        prefs = preferences.preferences
         
         # API Provider selection
         layout.label(text="AI Provider Selection:", icon='WORLD')
         layout.prop(prefs, "api_provider", text="")
         
         # Settings for the selected provider
-        selected_provider = prefs.api_provider
         box = layout.box()
+        settings = PROVIDER_SETTINGS.get(prefs.api_provider)
         
-        if selected_provider == 'anthropic':
-            box.label(text="Anthropic Settings:", icon='SETTINGS')
-            box.prop(prefs, "anthropic_api_key", text="API Key")
-            box.prop(prefs, "anthropic_model", text="Model")
-            
-        elif selected_provider == 'google':
-            box.label(text="Google Gemini Settings:", icon='SETTINGS')
-            box.prop(prefs, "google_api_key", text="API Key")
-            box.prop(prefs, "google_model", text="Model")
-            
-        elif selected_provider == 'deepseek':
-            box.label(text="DeepSeek Settings:", icon='SETTINGS')
-            box.prop(prefs, "deepseek_api_key", text="API Key")
-            box.prop(prefs, "deepseek_model", text="Model")
-            
-        elif selected_provider == 'openai':
-            box.label(text="OpenAI Settings:", icon='SETTINGS')
-            box.prop(prefs, "openai_api_key", text="API Key")
-            box.prop(prefs, "openai_model", text="Model")
+        if settings is not None:
+            label, api_key_prop, model_prop = settings
+            box.label(text=label, icon='SETTINGS')
+            box.prop(prefs, api_key_prop, text="API Key")
+            box.prop(prefs, model_prop, text="Model")
         
         # Validation button
         layout.operator("kitsune.validate_api_key", text="Validate API Key", icon='CHECKMARK')
@@ -298,13 +640,11 @@ class KITSUNE_PT_chat_settings(bpy.types.Panel):
     
     def draw(self, context):
         layout = self.layout
-        preferences = context.preferences.addons.get(__package__, None)
+        prefs = find_addon_preferences()
         
-        if not preferences:
+        if prefs is None:
             layout.label(text="Addon settings not found", icon='ERROR')
             return
-            
-        prefs = preferences.preferences
         
         # Chat settings
         layout.label(text="Chat Settings:", icon='OUTLINER_OB_FONT')
@@ -326,6 +666,10 @@ class KITSUNE_PT_chat_panel(bpy.types.Panel):
     bl_space_type = 'VIEW_3D'
     bl_region_type = 'UI'
     bl_category = 'Kitsune'
+    bl_options = {'DEFAULT_CLOSED'}
+    
+    # Last message drawing error, so persistent errors are logged only once
+    _last_draw_error = None
     
     def draw(self, context):
         layout = self.layout
@@ -338,9 +682,7 @@ class KITSUNE_PT_chat_panel(bpy.types.Panel):
         
         # Chat mode UI
         if kitsune_ui.view_mode == 'CHAT':
-            # Set panel height (fill to bottom of viewport)
-            region_height = context.region.height
-            panel_height = int(region_height * kitsune_ui.panel_height)
+            active_session = get_active_session(kitsune_ui)
             
             # Chat session management
             row = layout.row(align=True)
@@ -351,8 +693,7 @@ class KITSUNE_PT_chat_panel(bpy.types.Panel):
             
             if len(kitsune_ui.chat_sessions) > 0:
                 # Display session name (like a dropdown menu)
-                if kitsune_ui.active_session_index < len(kitsune_ui.chat_sessions):
-                    active_session = kitsune_ui.chat_sessions[kitsune_ui.active_session_index]
+                if active_session is not None:
                     row.label(text=active_session.name, icon='TEXT')
                     
                 # Session switch and delete buttons
@@ -363,17 +704,15 @@ class KITSUNE_PT_chat_panel(bpy.types.Panel):
                 sub_row.operator("kitsune.delete_chat", text="", icon='X')
             
             # Message display area - Claude-like simple design
+            # (its height comes from how many messages are shown, see panel_height)
             chat_box = layout.box()
-            # Maximize to fill viewport height
-            chat_box.scale_y = panel_height / 100
             
             # Display messages
-            if kitsune_ui.active_session_index < len(kitsune_ui.chat_sessions):
-                active_session = kitsune_ui.chat_sessions[kitsune_ui.active_session_index]
-                messages = active_session.messages
+            if active_session is not None:
+                message_count = active_session.message_count
                 
                 # If no messages, show placeholder
-                if len(messages) == 0:
+                if message_count == 0:
                     placeholder = chat_box.column(align=True)
                     placeholder.alignment = 'CENTER'
                     placeholder.label(text="Kitsune AI Assistant")
@@ -382,92 +721,103 @@ class KITSUNE_PT_chat_panel(bpy.types.Panel):
                 else:
                     # If there are messages, display them
                     # Limit displayed messages based on scroll position
-                    addon_prefs = context.preferences.addons[__package__].preferences
-                    scroll_pos = kitsune_ui.scroll_position
+                    addon_prefs = get_addon_preferences()
+                    scroll_pos = context.window_manager.kitsune_state.scroll_position
+                    visible_count = get_visible_message_count(context.region, kitsune_ui.panel_height)
                     
-                    # Select messages to display
-                    visible_messages = messages
-                    if len(messages) > 5:  # Limit to what fits in viewport
-                        start_idx = max(0, min(scroll_pos, len(messages) - 5))
-                        visible_messages = messages[start_idx:start_idx+5]
+                    # Select messages to display (limited to what fits in viewport)
+                    start_idx = max(0, min(scroll_pos, message_count - visible_count))
+                    end_idx = min(message_count, start_idx + visible_count)
+                    thumbnail_scale = PREVIEW_ICON_SCALES[kitsune_ui.image_preview_size]
                     
                     message_col = chat_box.column(align=True)
-                    for msg in visible_messages:
-                        draw_chat_message(message_col, msg, addon_prefs)
-                        message_col.separator(factor=0.5)
+                    try:
+                        # Building the records reads the stored messages, so it
+                        # is guarded along with the drawing
+                        visible_records = get_visible_records(active_session, start_idx, end_idx)
+                        for record in visible_records:
+                            draw_chat_message(message_col, record, addon_prefs, thumbnail_scale)
+                            message_col.separator(factor=0.5)
+                    except Exception as e:
+                        error = repr(e)
+                        if error != KITSUNE_PT_chat_panel._last_draw_error:
+                            KITSUNE_PT_chat_panel._last_draw_error = error
+                            utils.log_error(f"Failed to draw chat messages: {error}")
+                        message_col.label(text="Failed to draw messages", icon='ERROR')
                     
                     # Scroll buttons (if there are many messages)
-                    if len(messages) > 5:
+                    if message_count > visible_count:
                         scroll_row = layout.row(align=True)
                         scroll_row.scale_y = 0.8
                         scroll_up = scroll_row.operator("kitsune.scroll_chat", text="↑")
                         scroll_up.direction = 'UP'
                         scroll_down = scroll_row.operator("kitsune.scroll_chat", text="↓")
                         scroll_down.direction = 'DOWN'
-            
-            # Processing indicator
-            if kitsune_ui.is_processing:
-                processing_row = layout.row()
-                processing_row.alignment = 'CENTER'
-                processing_row.label(text="Processing...", icon='SORTTIME')
-            
-            # File attachment and input field
-            input_box = layout.column(align=True)
-            
-            # Attachment related (only image icon for images)
-            attach_row = input_box.row(align=True)
-            attach_row.scale_y = 1.1
-            attach_row.scale_x = 0.9
-            
-            if kitsune_ui.attachment_path:
-                file_name = kitsune_ui.attachment_path.split('/')[-1]
-                attach_row.label(text=file_name, icon='FILE_TICK')
-                attach_row.operator("kitsune.clear_attachment", text="", icon='X')
-            else:
-                attach_row.operator("kitsune.attach_image", text="", icon='IMAGE_DATA')
-            
-            # Input field and send button
-            input_row = input_box.row(align=True)
-            input_row.scale_y = 1.2
-            
-            # Text input field (expanded)
-            input_field = input_row.column()
-            input_field.prop(kitsune_ui, "input_text", text="")
-            
-            # Send button
-            send_btn = input_row.operator("kitsune.send_message", text="", icon='EXPORT')
-            
-            # Placeholder text
-            if not kitsune_ui.input_text.strip():
-                placeholder_text = "Type your message..."
-                input_box.label(text=placeholder_text, icon='GHOST_ENABLED')
         
         # Settings mode UI
         elif kitsune_ui.view_mode == 'SETTINGS':
-            # Settings tabs are implemented in child panels
-            pass
-
-# Image attachment operator
-class KITSUNE_OT_attach_image(bpy.types.Operator):
-    """Attach an image file"""
-    bl_idname = "kitsune.attach_image"
-    bl_label = "Attach Image"
-    bl_options = {'REGISTER', 'INTERNAL'}
-    
-    filepath: StringProperty(
-        name="File Path",
-        description="Path to the image file to attach",
-        subtype='FILE_PATH'
-    )
+            # Settings tabs are implemented in child panels, registered on
+            # first use (deferred to a timer, classes can't be registered in draw)
+            if not KITSUNE_PT_api_settings.is_registered:
+                if not bpy.app.timers.is_registered(ensure_settings_registered):
+                    bpy.app.timers.register(ensure_settings_registered)
+                layout.label(text="Loading settings...", icon='PREFERENCES')
+
+# Chat input sub-panel (volatile widgets, kept out of the message history panel)
+class KITSUNE_PT_chat_input(bpy.types.Panel):
+    """Kitsune chat input panel"""
+    bl_label = "Message Input"
+    bl_idname = "KITSUNE_PT_chat_input"
+    bl_space_type = 'VIEW_3D'
+    bl_region_type = 'UI'
+    bl_category = 'Kitsune'
+    bl_parent_id = "KITSUNE_PT_chat_panel"
+    bl_options = {'HIDE_HEADER'}
     
-    def execute(self, context):
-        utils.log_debug(f"Attaching image: {self.filepath}")
-        context.scene.kitsune_ui.attachment_path = self.filepath
-        return {'FINISHED'}
+    @classmethod
+    def poll(cls, context):
+        return context.scene.kitsune_ui.view_mode == 'CHAT'
     
-    def invoke(self, context, event):
-        context.window_manager.fileselect_add(self)
-        return {'RUNNING_MODAL'}
+    def draw(self, context):
+        layout = self.layout
+        ui_state = context.window_manager.kitsune_state
+        
+        # Processing indicator
+        if ui_state.is_processing:
+            processing_row = layout.row()
+            processing_row.alignment = 'CENTER'
+            processing_row.label(text="Processing...", icon='SORTTIME')
+        
+        # File attachment and input field
+        input_box = layout.column(align=True)
+        
+        # Attachment related (only image icon for images)
+        attach_row = input_box.row(align=True)
+        attach_row.scale_y = 1.1
+        attach_row.scale_x = 0.9
+        
+        if ui_state.attachment_path:
+            attach_row.label(text=ui_state.attachment_name, icon='FILE_TICK')
+            attach_row.operator("kitsune.clear_attachment", text="", icon='X')
+        else:
+            attach_op = attach_row.operator("kitsune.attach_file", text="", icon='IMAGE_DATA')
+            attach_op.mode = 'IMAGE'
+        
+        # Input field and send button
+        input_row = input_box.row(align=True)
+        input_row.scale_y = 1.2
+        
+        # Text input field (expanded)
+        input_field = input_row.column()
+        input_field.prop(ui_state, "input_text", text="")
+        
+        # Send button
+        send_btn = input_row.operator("kitsune.send_message", text="", icon='EXPORT')
+        
+        # Placeholder text
+        if not ui_state.has_input_text:
+            placeholder_text = "Type your message..."
+            input_box.label(text=placeholder_text, icon='GHOST_ENABLED')
 
 # Toggle view mode
 class KITSUNE_OT_toggle_view_mode(bpy.types.Operator):
@@ -478,10 +828,9 @@ class KITSUNE_OT_toggle_view_mode(bpy.types.Operator):
     
     def execute(self, context):
         kitsune_ui = context.scene.kitsune_ui
-        modes = ['CHAT', 'SETTINGS']
-        current_index = modes.index(kitsune_ui.view_mode)
-        next_index = (current_index + 1) % len(modes)
-        kitsune_ui.view_mode = modes[next_index]
+        current_index = VIEW_MODES.index(kitsune_ui.view_mode)
+        next_index = (current_index + 1) % len(VIEW_MODES)
+        kitsune_ui.view_mode = VIEW_MODES[next_index]
         return {'FINISHED'}
 
 # Chat scroll
@@ -493,21 +842,28 @@ class KITSUNE_OT_scroll_chat(bpy.types.Operator):
     
     direction: EnumProperty(
         name="Direction",
-        items=[('UP', "Up", "Scroll up"), ('DOWN', "Down", "Scroll down")],
+        items=SCROLL_DIRECTION_ITEMS,
         default='DOWN'
     )
     
     def execute(self, context):
         kitsune_ui = context.scene.kitsune_ui
+        ui_state = context.window_manager.kitsune_state
+        
+        active_session = get_active_session(kitsune_ui)
+        message_count = active_session.message_count if active_session else 0
+        # Same height factor as the panel, so the last page can be reached
+        visible_count = get_visible_message_count(context.region, kitsune_ui.panel_height)
+        max_scroll = max(0, message_count - visible_count)
+        # The stored position may be past the last page (see scroll_to_latest)
+        scroll_pos = min(max_scroll, ui_state.scroll_position)
         
         if self.direction == 'UP':
-            kitsune_ui.scroll_position = max(0, kitsune_ui.scroll_position - 1)
+            ui_state.scroll_position = max(0, scroll_pos - 1)
         else:
-            active_session = kitsune_ui.chat_sessions[kitsune_ui.active_session_index]
-            max_scroll = max(0, len(active_session.messages) - 5)
-            kitsune_ui.scroll_position = min(max_scroll, kitsune_ui.scroll_position + 1)
+            ui_state.scroll_position = min(max_scroll, scroll_pos + 1)
             
-        utils.log_debug(f"Scrolled chat {self.direction}. Position: {kitsune_ui.scroll_position}")
+        utils.log_debug("Scrolled chat %s. Position: %d", self.direction, ui_state.scroll_position)
         return {'FINISHED'}
 
 # New chat
@@ -525,13 +881,16 @@ class KITSUNE_OT_new_chat(bpy.types.Operator):
         new_session.name = f"New Chat {len(kitsune_ui.chat_sessions)}"
         
         # Set timestamp
-        now = datetime.datetime.now()
-        new_session.created_at = now.strftime("%Y-%m-%d %H:%M:%S")
+        new_session.created_at = datetime.datetime.now().isoformat(sep=' ', timespec='seconds')
+        new_session.session_id = uuid.uuid4().hex
         
         # Set new session as active
         kitsune_ui.active_session_index = len(kitsune_ui.chat_sessions) - 1
         
-        utils.log_debug(f"Created new chat session: {new_session.name}")
+        # Adding a session may move existing sessions in memory
+        invalidate_layout_plan()
+        
+        utils.log_debug("Created new chat session: %s", new_session.name)
         return {'FINISHED'}
 
 # Delete chat
@@ -555,6 +914,7 @@ class KITSUNE_OT_delete_chat(bpy.types.Operator):
             if index >= 0 and index < len(kitsune_ui.chat_sessions):
                 session_name = kitsune_ui.chat_sessions[index].name
                 kitsune_ui.chat_sessions.remove(index)
+                invalidate_layout_plan()
                 
                 # Adjust index to avoid out of range
                 if len(kitsune_ui.chat_sessions) > 0:
@@ -562,11 +922,18 @@ class KITSUNE_OT_delete_chat(bpy.types.Operator):
                 else:
                     kitsune_ui.active_session_index = 0
                 
-                utils.log_debug(f"Deleted chat session: {session_name}")
+                utils.log_debug("Deleted chat session: %s", session_name)
                 return {'FINISHED'}
         return {'CANCELLED'}
     
     def invoke(self, context, event):
+        kitsune_ui = context.scene.kitsune_ui
+        
+        # Skip the dialog when execute would cancel anyway
+        if not 0 <= kitsune_ui.active_session_index < len(kitsune_ui.chat_sessions):
+            self.report({'WARNING'}, "No chat session to delete")
+            return {'CANCELLED'}
+        
         return context.window_manager.invoke_props_dialog(self)
     
     def draw(self, context):
@@ -597,9 +964,11 @@ class KITSUNE_OT_rename_chat(bpy.types.Operator):
         kitsune_ui = context.scene.kitsune_ui
         
         if self.chat_index >= 0 and self.chat_index < len(kitsune_ui.chat_sessions):
-            old_name = kitsune_ui.chat_sessions[self.chat_index].name
-            kitsune_ui.chat_sessions[self.chat_index].name = self.new_name
-            utils.log_debug(f"Renamed chat: {old_name} → {self.new_name}")
+            session = kitsune_ui.chat_sessions[self.chat_index]
+            old_name = session.name
+            if old_name != self.new_name:
+                session.name = self.new_name
+                utils.log_debug("Renamed chat: %s → %s", old_name, self.new_name)
             return {'FINISHED'}
             
         return {'CANCELLED'}
@@ -618,7 +987,7 @@ class KITSUNE_OT_rename_chat(bpy.types.Operator):
 
 # File attachment
 class KITSUNE_OT_attach_file(bpy.types.Operator):
-    """Attach a file"""
+    """Attach a file or an image"""
     bl_idname = "kitsune.attach_file"
     bl_label = "Attach File"
     bl_options = {'REGISTER', 'INTERNAL'}
@@ -628,13 +997,25 @@ class KITSUNE_OT_attach_file(bpy.types.Operator):
         description="Path to the file to attach",
         subtype='FILE_PATH'
     )
+    mode: EnumProperty(
+        name="Mode",
+        description="Kind of file to pick",
+        items=ATTACH_MODE_ITEMS,
+        default='FILE'
+    )
+    filter_glob: StringProperty(
+        default="*",
+        options={'HIDDEN'}
+    )
     
     def execute(self, context):
-        utils.log_debug(f"Attaching file: {self.filepath}")
-        context.scene.kitsune_ui.attachment_path = self.filepath
+        utils.log_debug("Attaching %s: %s", self.mode.lower(), self.filepath)
+        context.window_manager.kitsune_state.attachment_path = self.filepath
         return {'FINISHED'}
     
     def invoke(self, context, event):
+        # Image mode only lists image files in the file browser
+        self.filter_glob = IMAGE_FILTER_GLOB if self.mode == 'IMAGE' else "*"
         context.window_manager.fileselect_add(self)
         return {'RUNNING_MODAL'}
 
@@ -647,7 +1028,9 @@ class KITSUNE_OT_clear_attachment(bpy.types.Operator):
     
     def execute(self, context):
         utils.log_debug("Clearing attachment")
-        context.scene.kitsune_ui.attachment_path = ""
+        ui_state = context.window_manager.kitsune_state
+        if ui_state.attachment_path:
+            ui_state.attachment_path = ""
         return {'FINISHED'}
 
 # API key validation
@@ -660,12 +1043,11 @@ class KITSUNE_OT_validate_api_key(bpy.types.Operator):
     def execute(self, context):
         utils.log_debug("Validating API key")
         
-        preferences = context.preferences.addons.get(__package__, None)
-        if not preferences:
+        prefs = find_addon_preferences()
+        if prefs is None:
             self.report({'ERROR'}, "Addon settings not found")
             return {'CANCELLED'}
-            
-        prefs = preferences.preferences
+        
         is_valid, message = prefs.validate_provider_api_key(context)
         
         if is_valid:
@@ -687,22 +1069,45 @@ class KITSUNE_OT_preview_code(bpy.types.Operator):
         description="Code to preview",
         default=""
     )
+    page: IntProperty(
+        name="Page",
+        description="Page of the code shown in the dialog",
+        default=1,
+        min=1
+    )
     
     def execute(self, context):
         utils.log_debug("Previewing code")
         return {'FINISHED'}
     
     def invoke(self, context, event):
+        # Full code goes to a text datablock (with syntax highlighting in the Text Editor)
+        write_code_text(PREVIEW_TEXT_NAME, self.code)
+        self.page = 1
         return context.window_manager.invoke_props_dialog(self, width=600)
     
     def draw(self, context):
         layout = self.layout
         layout.label(text="Generated Code:")
-        layout.separator()
         
-        # Text area to display code
-        for line in self.code.split('\n'):
-            layout.label(text=line)
+        # Only one page of the code is drawn in the dialog (split once, cached)
+        code_lines = split_code_lines(self.code)
+        page_count = max(1, -(-len(code_lines) // PREVIEW_DIALOG_LINES))
+        page = min(self.page, page_count)
+        start = (page - 1) * PREVIEW_DIALOG_LINES
+        
+        code_box = layout.box()
+        code_col = code_box.column(align=True)
+        for line in code_lines[start:start + PREVIEW_DIALOG_LINES]:
+            code_col.label(text=line)
+        
+        if page_count > 1:
+            page_row = layout.row()
+            page_row.prop(self, "page")
+            page_row.label(text=f"of {page_count}")
+        
+        layout.separator()
+        layout.label(text=f"Full code: Text Editor > {PREVIEW_TEXT_NAME}", icon='TEXT')
 
 # Execute code
 class KITSUNE_OT_execute_code(bpy.types.Operator):
@@ -720,12 +1125,29 @@ class KITSUNE_OT_execute_code(bpy.types.Operator):
     def execute(self, context):
         utils.log_debug("Executing code")
         try:
-            exec(self.code)
+            exec(compile_code(self.code), {"__name__": "__main__", "bpy": bpy})
             self.report({'INFO'}, "Code executed successfully")
             return {'FINISHED'}
         except Exception as e:
             self.report({'ERROR'}, f"Code execution error: {str(e)}")
             return {'CANCELLED'}
+    
+    def invoke(self, context, event):
+        if get_addon_preferences().confirm_code_execution:
+            return context.window_manager.invoke_props_dialog(self, width=600)
+        return self.execute(context)
+    
+    def draw(self, context):
+        layout = self.layout
+        layout.label(text="Execute this code?", icon='QUESTION')
+        
+        # Show only the head of the code (split once, cached across redraws)
+        preview_lines, hidden_lines = split_code_head(self.code, CODE_PREVIEW_LINES)
+        code_box = layout.box()
+        for line in preview_lines:
+            code_box.label(text=line)
+        if hidden_lines > 0:
+            code_box.label(text="...")
 
 # Cancel code
 class KITSUNE_OT_cancel_code(bpy.types.Operator):
@@ -747,101 +1169,119 @@ class KITSUNE_OT_send_message(bpy.types.Operator):
     
     def execute(self, context):
         kitsune_ui = context.scene.kitsune_ui
-        message_text = kitsune_ui.input_text.strip()
+        ui_state = context.window_manager.kitsune_state
+        message_text = ui_state.input_text.strip()
         
         if not message_text:
             self.report({'WARNING'}, "Please enter a message")
             return {'CANCELLED'}
         
         # Do nothing if already processing
-        if kitsune_ui.is_processing:
+        if ui_state.is_processing:
             self.report({'WARNING'}, "AI is processing. Please wait")
             return {'CANCELLED'}
         
         # Get or create active session
-        if len(kitsune_ui.chat_sessions) == 0:
+        active_session = get_active_session(kitsune_ui)
+        if active_session is None:
             bpy.ops.kitsune.new_chat()
-        
-        active_session = kitsune_ui.chat_sessions[kitsune_ui.active_session_index]
+            active_session = get_active_session(kitsune_ui)
         
         # Create user message
-        now = datetime.datetime.now()
-        timestamp = now.strftime("%H:%M")
-        
         user_message = active_session.messages.add()
         user_message.content = message_text
         user_message.sender = "USER"
-        user_message.timestamp = timestamp
+        user_message.timestamp = utils.format_timestamp()
+        active_session.message_count += 1
         
         # Add attachment if any
-        if kitsune_ui.attachment_path:
+        attachment_path = ui_state.attachment_path
+        if attachment_path:
+            attachment_name = ui_state.attachment_name
             attachment = user_message.attachments.add()
-            attachment.path = kitsune_ui.attachment_path
-            attachment.name = kitsune_ui.attachment_path.split('/')[-1]
+            attachment.path = attachment_path
+            attachment.name = attachment_name
             
             # Detect file type (simple version)
-            file_ext = attachment.name.split('.')[-1].lower() if '.' in attachment.name else ''
-            if file_ext in ['jpg', 'jpeg', 'png', 'bmp', 'tiff', 'tga']:
+            file_ext = os.path.splitext(attachment_name)[1][1:].lower()
+            if file_ext in IMAGE_EXTENSIONS:
                 attachment.type = "IMAGE"
             else:
                 attachment.type = "FILE"
-                
-            # Clear attachment path
-            kitsune_ui.attachment_path = ""
         
-        # Clear input field
-        kitsune_ui.input_text = ""
+        invalidate_layout_plan(active_session)
         
-        # Set processing flag
-        kitsune_ui.is_processing = True
+        # Reset the input widgets and set the processing flag in one place,
+        # after the message is built (the panel redraws once for all of them)
+        if attachment_path:
+            ui_state.attachment_path = ""
+        ui_state.input_text = ""
+        ui_state.is_processing = True
         
         # Scroll to latest message
-        active_session.active_message_index = len(active_session.messages) - 1
+        scroll_to_latest(ui_state, active_session, context.region, kitsune_ui.panel_height)
         
         # Get API provider and send request
-        utils.log_debug(f"Sending message: {message_text}")
+        utils.log_debug("Sending message: %s", message_text)
         
         try:
             # Get provider from addon settings
-            preferences = context.preferences.addons[__package__].preferences
+            preferences = get_addon_preferences()
             provider_id = preferences.api_provider
             provider = get_provider_instance(provider_id)
             
             if not provider:
                 self.report({'ERROR'}, f"Failed to initialize provider: {provider_id}")
-                kitsune_ui.is_processing = False
+                ui_state.is_processing = False
                 return {'CANCELLED'}
             
             # Check if provider's API key is set
-            api_key_attr = f"{provider_id}_api_key"
-            api_key = getattr(preferences, api_key_attr, "")
+            api_key = getattr(preferences, PROVIDER_SETTINGS[provider_id][1])
             
             if not api_key:
                 self.report({'ERROR'}, f"API key for {provider_id} is not set. Please add your API key in settings.")
-                kitsune_ui.is_processing = False
+                ui_state.is_processing = False
                 return {'CANCELLED'}
             
             # Create context information
             context_info = create_context_info()
             
-            # Add chat history
-            context_info["chat_history"] = []
-            for msg in active_session.messages:
-                context_info["chat_history"].append({
-                    "role": "user" if msg.sender == "USER" else "assistant",
-                    "content": msg.content
-                })
+            # Add chat history, capped to the newest messages (0 sends all);
+            # the stored messages are kept
+            history = get_chat_history(active_session)
+            max_length = preferences.max_conversation_length
+            if max_length > 0:
+                history = history[-max_length:]
+            context_info["chat_history"] = history
+            
+            # Sessions can be added or deleted before the response arrives, so
+            # the callback looks the session up again instead of keeping a reference
+            if not active_session.session_id:
+                active_session.session_id = uuid.uuid4().hex
+            session_id = active_session.session_id
             
             # API request callback function
             def api_response_callback(response):
                 try:
                     # UI updates must be done in Blender's main thread
                     def update_ui():
+                        # The file or scene may have changed while waiting, so
+                        # nothing from execute's context is kept
+                        ui_state = bpy.context.window_manager.kitsune_state
                         try:
+                            # The session may have been deleted (or the scene switched) while waiting
+                            session = find_session(session_id)
+                            if session is None:
+                                utils.log_debug("Chat session was removed, dropping the response")
+                                if ui_state.is_processing:
+                                    ui_state.is_processing = False
+                                return None
+                            
                             # Create AI response message
-                            ai_message = active_session.messages.add()
+                            ai_message = session.messages.add()
                             ai_message.sender = "AI"
-                            ai_message.timestamp = datetime.datetime.now().strftime("%H:%M")
+                            ai_message.timestamp = utils.format_timestamp()
+                            session.message_count += 1
                             
                             # Check for errors
                             if "error" in response:
@@ -851,40 +1291,46 @@ class KITSUNE_OT_send_message(bpy.types.Operator):
                                 # 修正: responseからテキストを取得する方法を変更
                                 # response.get("text", "Empty response") だと表示されない
                                 ai_message.content = response.get("response", response.get("text", "Empty response"))
-                                utils.log_debug(f"Response content: {ai_message.content[:100]}...")
+                                if utils.DEBUG_ENABLED:
+                                    utils.log_debug(f"Response content: {ai_message.content[:100]}...")
                                 
-                                # Extract code if present
-                                from .api import format_code_for_execution
-                                code = format_code_for_execution(ai_message.content)
+                                # Code is extracted on the request thread (see api.dispatch_response)
+                                code = response.get("code")
                                 if code:
                                     ai_message.code = code
                             
+                            invalidate_layout_plan(session)
+                            
                             # Reset processing flag
-                            kitsune_ui.is_processing = False
+                            if ui_state.is_processing:
+                                ui_state.is_processing = False
                             
                             # Request UI update
-                            for area in bpy.context.screen.areas:
-                                if area.type == 'VIEW_3D':
-                                    area.tag_redraw()
-                                    
+                            schedule_redraw()
+                            
                             # Scroll to latest message
-                            if len(active_session.messages) > 0:
-                                active_session.active_message_index = len(active_session.messages) - 1
+                            # The session's scene holds the panel height
+                            scroll_to_latest(ui_state, session, find_sidebar_region(),
+                                             session.id_data.kitsune_ui.panel_height)
                             
                             utils.log_debug("API request completed, UI updated")
                             return None
                             
                         except Exception as e:
                             utils.log_error(f"UI update error: {str(e)}")
-                            kitsune_ui.is_processing = False
+                            if ui_state.is_processing:
+                                ui_state.is_processing = False
                             return None
                     
-                    # Schedule UI update in main thread
-                    bpy.app.timers.register(update_ui, first_interval=0.1)
+                    # Already on the main thread (see api.dispatch_response)
+                    update_ui()
                     
                 except Exception as e:
                     utils.log_error(f"Callback error: {str(e)}")
-                    kitsune_ui.is_processing = False
+                    bpy.context.window_manager.kitsune_state.is_processing = False
+            
+            # Show the user's message right away, before the request starts
+            schedule_redraw()
             
             # Execute API request in separate thread
             request_thread = APIRequestThread(
@@ -900,7 +1346,7 @@ class KITSUNE_OT_send_message(bpy.types.Operator):
         except Exception as e:
             utils.log_error(f"Message send error: {str(e)}")
             self.report({'ERROR'}, f"Error occurred: {str(e)}")
-            kitsune_ui.is_processing = False
+            ui_state.is_processing = False
             return {'CANCELLED'}
 
 # Clear chat
@@ -920,9 +1366,13 @@ class KITSUNE_OT_clear_chat(bpy.types.Operator):
         if self.confirm:
             kitsune_ui = context.scene.kitsune_ui
             
-            if kitsune_ui.active_session_index < len(kitsune_ui.chat_sessions):
-                active_session = kitsune_ui.chat_sessions[kitsune_ui.active_session_index]
-                active_session.messages.clear()
+            active_session = get_active_session(kitsune_ui)
+            if active_session is not None:
+                if active_session.message_count:
+                    active_session.messages.clear()
+                    active_session.message_count = 0
+                    invalidate_layout_plan(active_session)
+                    _chat_histories.pop(active_session.as_pointer(), None)
                 utils.log_debug("Cleared chat history")
                 return {'FINISHED'}
         return {'CANCELLED'}
@@ -959,20 +1409,18 @@ classes = (
     KitsuneAttachment,
     KitsuneChatMessage,
     KitsuneChatSession,
+    KitsuneUIState,
     KitsuneUIProperties,
     KITSUNE_UL_chat_sessions,
     KITSUNE_PT_chat_panel,
-    KITSUNE_PT_api_settings,
-    KITSUNE_PT_chat_settings,
+    KITSUNE_PT_chat_input,
     KITSUNE_OT_toggle_view_mode,
     KITSUNE_OT_scroll_chat,
     KITSUNE_OT_new_chat,
     KITSUNE_OT_delete_chat,
     KITSUNE_OT_rename_chat,
     KITSUNE_OT_attach_file,
-    KITSUNE_OT_attach_image,
     KITSUNE_OT_clear_attachment,
-    KITSUNE_OT_validate_api_key,
     KITSUNE_OT_preview_code,
     KITSUNE_OT_execute_code,
     KITSUNE_OT_cancel_code,
@@ -981,39 +1429,91 @@ classes = (
     KITSUNE_OT_copy_code
 )
 
+# Settings mode classes, registered on the first switch to settings mode
+settings_classes = (
+    KITSUNE_PT_api_settings,
+    KITSUNE_PT_chat_settings,
+    KITSUNE_OT_validate_api_key
+)
+
+# Unregister order (child panels before their parent)
+_classes_reversed = classes[::-1]
+_settings_classes_reversed = settings_classes[::-1]
+
+# Register/unregister all UI classes in one batch (unregisters in reverse order)
+_register_classes, _unregister_classes = bpy.utils.register_classes_factory(classes)
+
+def ensure_settings_registered():
+    """Register the settings mode classes if they are not registered yet"""
+    for cls in settings_classes:
+        if not cls.is_registered:
+            try:
+                bpy.utils.register_class(cls)
+            except RuntimeError as e:
+                utils.log_error(f"Failed to register {cls.__name__}: {str(e)}")
+    return None
+
 def register():
     """Register UI classes."""
-    # Check for already registered classes to avoid errors
-    for cls in classes:
-        try:
+    # Unregister only the classes that are already registered (e.g. on reload),
+    # settings child panels before the main panel
+    for cls in _settings_classes_reversed + _classes_reversed:
+        if cls.is_registered:
             bpy.utils.unregister_class(cls)
-        except:
-            pass
     
-    # Register classes
-    for cls in classes:
-        try:
-            bpy.utils.register_class(cls)
-        except Exception as e:
-            utils.log_error(f"Failed to register class {cls.__name__}: {str(e)}")
+    try:
+        _register_classes()
+    except RuntimeError as e:
+        utils.log_error(f"Failed to register UI classes: {str(e)}")
     
-    # Register properties on the scene
+    # Register properties on the scene (saved) and the window manager (transient)
     try:
         bpy.types.Scene.kitsune_ui = PointerProperty(type=KitsuneUIProperties)
+        bpy.types.WindowManager.kitsune_state = PointerProperty(type=KitsuneUIState)
     except Exception as e:
         utils.log_error(f"Failed to register kitsune_ui property: {str(e)}")
+    
+    # Sessions of files loaded later are synced on load, the open file on the first tick
+    if on_load_post not in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.append(on_load_post)
+    for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if on_undo_redo not in handlers:
+            handlers.append(on_undo_redo)
+    if not bpy.app.timers.is_registered(sync_message_counts):
+        bpy.app.timers.register(sync_message_counts, first_interval=0.0)
 
 def unregister():
     """Unregister UI classes."""
-    # Remove properties from the scene
-    try:
+    invalidate_layout_plan()
+    free_thumbnails()
+    
+    if on_load_post in bpy.app.handlers.load_post:
+        bpy.app.handlers.load_post.remove(on_load_post)
+    for handlers in (bpy.app.handlers.undo_post, bpy.app.handlers.redo_post):
+        if on_undo_redo in handlers:
+            handlers.remove(on_undo_redo)
+    if bpy.app.timers.is_registered(sync_message_counts):
+        bpy.app.timers.unregister(sync_message_counts)
+    if bpy.app.timers.is_registered(_redraw_now):
+        bpy.app.timers.unregister(_redraw_now)
+    
+    # Remove properties from the scene and the window manager
+    if hasattr(bpy.types.Scene, "kitsune_ui"):
         del bpy.types.Scene.kitsune_ui
-    except Exception as e:
-        utils.log_error(f"Failed to unregister kitsune_ui property: {str(e)}")
+    if hasattr(bpy.types.WindowManager, "kitsune_state"):
+        del bpy.types.WindowManager.kitsune_state
     
-    # Unregister classes in reverse order
-    for cls in reversed(classes):
-        try:
-            bpy.utils.unregister_class(cls)
-        except Exception as e:
-            utils.log_error(f"Failed to unregister class {cls.__name__}: {str(e)}")
\ No newline at end of file
+    if bpy.app.timers.is_registered(ensure_settings_registered):
+        bpy.app.timers.unregister(ensure_settings_registered)
+    
+    for cls in _settings_classes_reversed:
+        if cls.is_registered:
+            try:
+                bpy.utils.unregister_class(cls)
+            except RuntimeError as e:
+                utils.log_error(f"Failed to unregister {cls.__name__}: {str(e)}")
+    
+    try:
+        _unregister_classes()
+    except RuntimeError as e:
+        utils.log_error(f"Failed to unregister UI classes: {str(e)}")
@@ -1,6 +1,8 @@
 import bpy
+import logging
 import os
 import sys
+import time
 
 # ロギングレベル
 DEBUG = 1
@@ -11,6 +13,18 @@ ERROR = 4
 # デフォルトのロギングレベル
 _current_log_level = INFO
 
+# デバッグログが有効かどうか (ホットパスでの事前チェック用)
+DEBUG_ENABLED = False
+
+# アドオン用のロガー (フォーマッタで接頭辞を付け、書式化はレベルが有効なときだけ行う)
+_logger = logging.getLogger("kitsune")
+_logger.setLevel(logging.INFO)
+_logger.propagate = False
+if not _logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("[KITSUNE-%(levelname)s] %(message)s"))
+    _logger.addHandler(_handler)
+
 def set_debug_mode(enable=True):
     """
     デバッグモードを設定します。
@@ -18,19 +32,24 @@ def set_debug_mode(enable=True):
     Args:
         enable (bool): デバッグモードを有効にするかどうか
     """
-    global _current_log_level
+    global _current_log_level, DEBUG_ENABLED
     _current_log_level = DEBUG if enable else INFO
-    log_debug(f"Debug mode {'enabled' if enable else 'disabled'}")
+    DEBUG_ENABLED = _current_log_level <= DEBUG
+    _logger.setLevel(logging.DEBUG if DEBUG_ENABLED else logging.INFO)
+    log_debug("Debug mode %s", "enabled" if enable else "disabled")
 
-def log_debug(message):
+def log_debug(message, *args):
     """
     デバッグメッセージをログに記録します。
     
+    args が指定された場合、デバッグが有効なときだけ message % args でフォーマットします。
+    
     Args:
         message (str): ログメッセージ
+        *args: フォーマット引数
     """
-    if _current_log_level <= DEBUG:
-        print(f"[KITSUNE-DEBUG] {message}")
+    if DEBUG_ENABLED:
+        _logger.debug(message, *args)
 
 def log_info(message):
     """
@@ -39,8 +58,7 @@ def log_info(message):
     Args:
         message (str): ログメッセージ
     """
-    if _current_log_level <= INFO:
-        print(f"[KITSUNE-INFO] {message}")
+    _logger.info(message)
 
 def log_warning(message):
     """
@@ -49,8 +67,7 @@ def log_warning(message):
     Args:
         message (str): ログメッセージ
     """
-    if _current_log_level <= WARNING:
-        print(f"[KITSUNE-WARNING] {message}")
+    _logger.warning(message)
 
 def log_error(message):
     """
@@ -59,8 +76,27 @@ def log_error(message):
     Args:
         message (str): ログメッセージ
     """
-    if _current_log_level <= ERROR:
-        print(f"[KITSUNE-ERROR] {message}")
+    _logger.error(message)
+
+# 直近に生成したタイムスタンプ (同じ秒内の呼び出しで再利用)
+_timestamp_second = None
+_timestamp_text = ""
+
+def format_timestamp():
+    """
+    チャットメッセージ用の現在時刻 (HH:MM) を返します。
+    
+    同じ秒内の呼び出しではフォーマット済みの文字列を再利用します。
+    
+    Returns:
+        str: フォーマットされた時刻
+    """
+    global _timestamp_second, _timestamp_text
+    second = int(time.time())
+    if second != _timestamp_second:
+        _timestamp_second = second
+        _timestamp_text = time.strftime("%H:%M", time.localtime(second))
+    return _timestamp_text
 
 def ensure_directory_exists(directory_path):
     """
@@ -75,7 +111,7 @@ def ensure_directory_exists(directory_path):
     try:
         if not os.path.exists(directory_path):
             os.makedirs(directory_path)
-            log_debug(f"Directory created: {directory_path}")
+            log_debug("Directory created: %s", directory_path)
         return True
     except Exception as e:
         log_error(f"Failed to create directory {directory_path}: {str(e)}")
@@ -111,13 +147,23 @@ def check_ui_resources():
         log_error(f"UI resources check failed: {str(e)}")
         return False
 
-def get_blender_version():
+# 対応する最小の Blender バージョン
+REQUIRED_BLENDER_VERSION = (3, 0, 0)
+
+# check_blender_compatibility / check_dependencies の結果 (invalidate_caches でクリア)
+_compat_cache = None
+_deps_cache = None
+
+def invalidate_caches():
     """
-    Get the current Blender version as a tuple.
-    
-    Returns:
-        tuple: (major, minor, patch)
+    互換性チェックと依存関係チェックのキャッシュをクリアします。
     """
+    global _compat_cache, _deps_cache
+    _compat_cache = None
+    _deps_cache = None
+
+def _detect_blender_version():
+    """Read the Blender version from bpy.app (used once at import)."""
     try:
         # 通常の方法
         return bpy.app.version
@@ -142,23 +188,43 @@ def get_blender_version():
         # それでも失敗する場合はフォールバック
         return (3, 0, 0)
 
+# Blender のバージョン (プロセス中は変わらないのでインポート時に一度だけ取得)
+BLENDER_VERSION = _detect_blender_version()
+
+def get_blender_version():
+    """
+    Get the current Blender version as a tuple.
+    
+    Returns:
+        tuple: (major, minor, patch)
+    """
+    return BLENDER_VERSION
+
 def check_blender_compatibility():
     """
     Check if the current Blender version is compatible.
     
+    The result is cached until invalidate_caches() is called.
+    
     Returns:
         tuple: (is_compatible, message)
     """
+    global _compat_cache
+    if _compat_cache is None:
+        _compat_cache = _check_blender_compatibility()
+    return _compat_cache
+
+def _check_blender_compatibility():
+    """Run the Blender version check (uncached)."""
     try:
-        current_version = get_blender_version()
-        required_version = (3, 0, 0)
+        current_version = BLENDER_VERSION
+        version_text = "%d.%d.%d" % tuple(current_version[:3])
         
-        if current_version < required_version:
-            msg = f"Kitsune requires Blender {required_version[0]}.{required_version[1]}.{required_version[2]} or newer. " \
-                  f"Current version: {current_version[0]}.{current_version[1]}.{current_version[2]}"
-            return False, msg
+        if current_version < REQUIRED_BLENDER_VERSION:
+            required_text = "%d.%d.%d" % REQUIRED_BLENDER_VERSION
+            return False, f"Kitsune requires Blender {required_text} or newer. Current version: {version_text}"
         
-        return True, f"Compatible with Blender {current_version[0]}.{current_version[1]}.{current_version[2]}"
+        return True, f"Compatible with Blender {version_text}"
     except Exception as e:
         log_error(f"Error checking Blender compatibility: {str(e)}")
         return True, "Blender version check failed, proceeding anyway"
@@ -167,9 +233,18 @@ def check_dependencies():
     """
     Check if all required dependencies are installed.
     
+    The result is cached until invalidate_caches() is called.
+    
     Returns:
         tuple: (is_all_dependencies_ok, list_of_missing_dependencies)
     """
+    global _deps_cache
+    if _deps_cache is None:
+        _deps_cache = _check_dependencies()
+    return _deps_cache
+
+def _check_dependencies():
+    """Run the dependency check (uncached)."""
     missing_dependencies = []
     
     # RequestsとJSON（標準ライブラリ）を確認